@@ -3,21 +3,41 @@ Azure DevOps Client Module
 Handles all ADO API interactions for user stories and test cases
 """
 
-import aiohttp
-import json
+import asyncio
+import re
 import base64
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timezone
+from typing import Dict, List
+from alm_base import ALMClientBase, StoryCache, json_loads
 
 logger = logging.getLogger(__name__)
 
-class ADOClient:
+# Most work item ids the ADO batch GET endpoint accepts per request
+WORK_ITEM_BATCH_SIZE = 200
+
+# Relation types kept on a fetched user story
+_STORY_RELATION_TYPES = frozenset({
+    "System.LinkTypes.Hierarchy-Forward",
+    "Microsoft.VSTS.Common.TestedBy-Forward"
+})
+
+# Work item ID at the end of a relation URL (.../_apis/wit/workItems/123)
+_WORKITEM_ID_RE = re.compile(r"workitems/(\d+)", re.IGNORECASE)
+
+def _wiql_escape(value: str) -> str:
+    """Escape a value for use inside a single-quoted WIQL string literal"""
+    return str(value).replace("'", "''")
+
+class ADOClient(ALMClientBase):
     def __init__(self):
+        super().__init__()
         self.base_url = None
         self.project = None
+        self.wit_url = None
         self.personal_access_token = None
         self.headers = {}
+        self._stories = StoryCache(self._request_user_story)
+        self.patch_headers = {}
         self.is_configured = False
     
     def configure(self, organization: str, project: str, personal_access_token: str):
@@ -25,6 +45,8 @@ class ADOClient:
         self.base_url = f"https://dev.azure.com/{organization}"
         self.project = project
         self.personal_access_token = personal_access_token
+        # Work item tracking API root shared by every work item/WIQL call
+        self.wit_url = f"{self.base_url}/{project}/_apis/wit"
         
         # Create auth header
         auth_string = f":{personal_access_token}"
@@ -35,7 +57,11 @@ class ADOClient:
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
+        # Work item create/update/link calls all send JSON Patch documents
+        self.patch_headers = {**self.headers, "Content-Type": "application/json-patch+json"}
         
+        # Cached and in-flight stories belong to the previous connection
+        self._stories.clear()
         self.is_configured = True
         logger.info(f"ADO client configured for project: {project}")
     
@@ -46,85 +72,89 @@ class ADOClient:
         
         url = f"{self.base_url}/_apis/projects/{self.project}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as response:
-                result = {
-                    "success": response.status == 200,
-                    "status_code": response.status,
-                    "project": self.project
+        session = await self._get_session()
+        async with session.get(url, headers=self.headers) as response:
+            result = {
+                "success": response.status == 200,
+                "status_code": response.status,
+                "project": self.project
+            }
+            
+            if response.status == 200:
+                project_data = await response.json(loads=json_loads)
+                result["project_info"] = {
+                    "id": project_data.get("id"),
+                    "name": project_data.get("name"),
+                    "description": project_data.get("description"),
+                    "url": project_data.get("url")
                 }
-                
-                if response.status == 200:
-                    project_data = await response.json()
-                    result["project_info"] = {
-                        "id": project_data.get("id"),
-                        "name": project_data.get("name"),
-                        "description": project_data.get("description"),
-                        "url": project_data.get("url")
-                    }
-                else:
-                    result["error"] = await response.text()
-                
-                return result
+            else:
+                result["error"] = await response.text()
+            
+            return result
     
     async def fetch_user_story(self, user_story_id: int) -> Dict:
         """Fetch user story details from ADO"""
         if not self.is_configured:
             raise ValueError("ADO client not configured")
         
+        return await self._stories.get(user_story_id)
+    
+    async def _request_user_story(self, user_story_id: int) -> Dict:
+        """Request a user story from the API"""
         # Fetch work item details
-        url = f"{self.base_url}/{self.project}/_apis/wit/workitems/{user_story_id}"
+        url = f"{self.wit_url}/workitems/{user_story_id}"
         params = {
             "$expand": "relations",
             "api-version": "7.1-preview.3"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    return {
-                        "success": False,
-                        "error": f"Failed to fetch user story: {error_text}",
-                        "status_code": response.status
-                    }
-                
-                work_item = await response.json()
-                
-                # Extract relevant fields
-                fields = work_item.get("fields", {})
-                
-                user_story_data = {
-                    "success": True,
-                    "id": work_item.get("id"),
-                    "title": fields.get("System.Title"),
-                    "description": fields.get("System.Description", ""),
-                    "state": fields.get("System.State"),
-                    "work_item_type": fields.get("System.WorkItemType"),
-                    "assigned_to": fields.get("System.AssignedTo", {}).get("displayName") if fields.get("System.AssignedTo") else None,
-                    "created_date": fields.get("System.CreatedDate"),
-                    "changed_date": fields.get("System.ChangedDate"),
-                    "area_path": fields.get("System.AreaPath"),
-                    "iteration_path": fields.get("System.IterationPath"),
-                    "tags": fields.get("System.Tags", ""),
-                    "priority": fields.get("Microsoft.VSTS.Common.Priority"),
-                    "business_value": fields.get("Microsoft.VSTS.Common.BusinessValue"),
-                    "acceptance_criteria": fields.get("Microsoft.VSTS.Common.AcceptanceCriteria", ""),
-                    "story_points": fields.get("Microsoft.VSTS.Scheduling.StoryPoints"),
-                    "relations": []
+        session = await self._get_session()
+        async with session.get(url, headers=self.headers, params=params) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                return {
+                    "success": False,
+                    "error": f"Failed to fetch user story: {error_text}",
+                    "status_code": response.status
                 }
-                
-                # Extract relations (linked work items)
-                relations = work_item.get("relations", [])
-                for relation in relations:
-                    if relation.get("rel") in ["System.LinkTypes.Hierarchy-Forward", "Microsoft.VSTS.Common.TestedBy-Forward"]:
-                        user_story_data["relations"].append({
-                            "rel": relation.get("rel"),
-                            "url": relation.get("url"),
-                            "attributes": relation.get("attributes", {})
-                        })
-                
-                return user_story_data
+            
+            work_item = await response.json(loads=json_loads)
+            
+            # Extract relevant fields
+            fields = work_item.get("fields", {})
+            
+            user_story_data = {
+                "success": True,
+                "id": work_item.get("id"),
+                "title": fields.get("System.Title"),
+                "description": fields.get("System.Description", ""),
+                "state": fields.get("System.State"),
+                "work_item_type": fields.get("System.WorkItemType"),
+                "assigned_to": fields.get("System.AssignedTo", {}).get("displayName") if fields.get("System.AssignedTo") else None,
+                "created_date": fields.get("System.CreatedDate"),
+                "changed_date": fields.get("System.ChangedDate"),
+                "area_path": fields.get("System.AreaPath"),
+                "iteration_path": fields.get("System.IterationPath"),
+                "tags": fields.get("System.Tags", ""),
+                "priority": fields.get("Microsoft.VSTS.Common.Priority"),
+                "business_value": fields.get("Microsoft.VSTS.Common.BusinessValue"),
+                "acceptance_criteria": fields.get("Microsoft.VSTS.Common.AcceptanceCriteria", ""),
+                "story_points": fields.get("Microsoft.VSTS.Scheduling.StoryPoints"),
+                "relations": []
+            }
+            
+            # Extract relations (linked work items)
+            relations = work_item.get("relations", [])
+            for relation in relations:
+                if relation.get("rel") in _STORY_RELATION_TYPES:
+                    user_story_data["relations"].append({
+                        "rel": relation.get("rel"),
+                        "url": relation.get("url"),
+                        "attributes": relation.get("attributes", {})
+                    })
+            
+            return user_story_data
     
     async def fetch_testcases(self, user_story_id: int) -> Dict:
         """Fetch all test cases linked to a user story"""
@@ -142,17 +172,15 @@ class ADOClient:
         for relation in user_story.get("relations", []):
             if "TestedBy" in relation.get("rel", ""):
                 # Extract work item ID from URL
-                url = relation.get("url", "")
-                if "workitems/" in url:
-                    tc_id = url.split("workitems/")[-1]
-                    test_case_ids.append(int(tc_id))
+                match = _WORKITEM_ID_RE.search(relation.get("url", ""))
+                if match:
+                    test_case_ids.append(int(match.group(1)))
         
-        # Fetch details for each test case
-        test_cases = []
-        for tc_id in test_case_ids:
-            tc_data = await self._fetch_test_case_details(tc_id)
-            if tc_data.get("success"):
-                test_cases.append(tc_data)
+        # Fetch details in batches of up to WORK_ITEM_BATCH_SIZE ids per request
+        batches = [test_case_ids[i:i + WORK_ITEM_BATCH_SIZE]
+                   for i in range(0, len(test_case_ids), WORK_ITEM_BATCH_SIZE)]
+        details = await asyncio.gather(*[self._fetch_test_case_details_batch(batch) for batch in batches])
+        test_cases = [tc_data for batch in details for tc_data in batch if tc_data.get("success")]
         
         return {
             "success": True,
@@ -163,35 +191,75 @@ class ADOClient:
     
     async def _fetch_test_case_details(self, test_case_id: int) -> Dict:
         """Fetch individual test case details"""
-        url = f"{self.base_url}/{self.project}/_apis/wit/workitems/{test_case_id}"
+        url = f"{self.wit_url}/workitems/{test_case_id}"
         params = {"api-version": "7.1-preview.3"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status != 200:
-                    return {
-                        "success": False,
-                        "error": f"Failed to fetch test case {test_case_id}",
-                        "test_case_id": test_case_id
-                    }
-                
-                work_item = await response.json()
-                fields = work_item.get("fields", {})
-                
+        session = await self._get_session()
+        async with session.get(url, headers=self.headers, params=params) as response:
+            if response.status != 200:
                 return {
-                    "success": True,
-                    "id": test_case_id,
-                    "title": fields.get("System.Title"),
-                    "state": fields.get("System.State"),
-                    "priority": fields.get("Microsoft.VSTS.Common.Priority"),
-                    "test_steps": fields.get("Microsoft.VSTS.TCM.Steps", ""),
-                    "created_date": fields.get("System.CreatedDate"),
-                    "changed_date": fields.get("System.ChangedDate"),
-                    "assigned_to": fields.get("System.AssignedTo", {}).get("displayName") if fields.get("System.AssignedTo") else None
+                    "success": False,
+                    "error": f"Failed to fetch test case {test_case_id}",
+                    "test_case_id": test_case_id
                 }
+            
+            work_item = await response.json(loads=json_loads)
+            return self._summarize_test_case(test_case_id, work_item.get("fields", {}))
+    
+    async def _fetch_test_case_details_batch(self, test_case_ids: List[int]) -> List[Dict]:
+        """Fetch details for several test cases with a single request"""
+        url = f"{self.wit_url}/workitems"
+        params = {
+            "ids": ",".join(str(tc_id) for tc_id in test_case_ids),
+            # Deleted or inaccessible items come back as null instead of failing the batch
+            "errorPolicy": "omit",
+            "api-version": "7.1-preview.3"
+        }
+        
+        session = await self._get_session()
+        async with session.get(url, headers=self.headers, params=params) as response:
+            if response.status != 200:
+                # Fall back to per-item requests so one bad id does not hide the rest
+                return list(await asyncio.gather(*[self._fetch_test_case_details(tc_id) for tc_id in test_case_ids]))
+            
+            work_items = {item.get("id"): item for item in (await response.json(loads=json_loads)).get("value", []) if item}
+        
+        results = []
+        for tc_id in test_case_ids:
+            work_item = work_items.get(tc_id)
+            if work_item is None:
+                results.append({
+                    "success": False,
+                    "error": f"Failed to fetch test case {tc_id}",
+                    "test_case_id": tc_id
+                })
+            else:
+                results.append(self._summarize_test_case(tc_id, work_item.get("fields", {})))
+        return results
+    
+    @staticmethod
+    def _summarize_test_case(test_case_id: int, fields: Dict) -> Dict:
+        """Extract the test case fields returned to tools"""
+        return {
+            "success": True,
+            "id": test_case_id,
+            "title": fields.get("System.Title"),
+            "state": fields.get("System.State"),
+            "priority": fields.get("Microsoft.VSTS.Common.Priority"),
+            "test_steps": fields.get("Microsoft.VSTS.TCM.Steps", ""),
+            "created_date": fields.get("System.CreatedDate"),
+            "changed_date": fields.get("System.ChangedDate"),
+            "assigned_to": fields.get("System.AssignedTo", {}).get("displayName") if fields.get("System.AssignedTo") else None
+        }
     
     async def create_testcase(self, user_story_id: int, testcase_data: Dict) -> Dict:
         """Create a new test case linked to a user story"""
+        # Bound concurrent writes; ALM hosts throttle writes well below reads
+        async with self._write_semaphore:
+            return await self._create_testcase(user_story_id, testcase_data)
+    
+    async def _create_testcase(self, user_story_id: int, testcase_data: Dict) -> Dict:
+        """Create and link a test case; called with a write slot held"""
         if not self.is_configured:
             raise ValueError("ADO client not configured")
         
@@ -237,50 +305,60 @@ class ADOClient:
             })
         
         # Create the test case
-        url = f"{self.base_url}/{self.project}/_apis/wit/workitems/$Test%20Case"
+        url = f"{self.wit_url}/workitems/$Test%20Case"
         params = {"api-version": "7.1-preview.3"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.patch(
-                url, 
-                headers={**self.headers, "Content-Type": "application/json-patch+json"},
-                json=test_case_fields,
-                params=params
-            ) as response:
-                
-                if response.status not in [200, 201]:
-                    error_text = await response.text()
-                    return {
-                        "success": False,
-                        "error": f"Failed to create test case: {error_text}",
-                        "status_code": response.status
-                    }
-                
-                test_case = await response.json()
-                test_case_id = test_case.get("id")
-                
-                # Now link the test case to the user story
-                link_result = await self._link_test_case_to_user_story(test_case_id, user_story_id)
-                
+        session = await self._get_session()
+        async with session.patch(
+            url, 
+            headers=self.patch_headers,
+            json=test_case_fields,
+            params=params
+        ) as response:
+            
+            if response.status not in [200, 201]:
+                error_text = await response.text()
                 return {
-                    "success": True,
-                    "test_case_id": test_case_id,
-                    "title": test_case.get("fields", {}).get("System.Title"),
-                    "user_story_id": user_story_id,
-                    "link_success": link_result.get("success", False),
-                    "url": test_case.get("url"),
-                    "created_date": test_case.get("fields", {}).get("System.CreatedDate")
+                    "success": False,
+                    "error": f"Failed to create test case: {error_text}",
+                    "status_code": response.status
                 }
+            
+            test_case = await response.json(loads=json_loads)
+            test_case_id = test_case.get("id")
+            
+            # Now link the test case to the user story
+            link_result = await self._link_test_case_to_user_story(test_case_id, user_story_id)
+            
+            return {
+                "success": True,
+                "test_case_id": test_case_id,
+                "title": test_case.get("fields", {}).get("System.Title"),
+                "user_story_id": user_story_id,
+                "link_success": link_result.get("success", False),
+                "url": test_case.get("url"),
+                "created_date": test_case.get("fields", {}).get("System.CreatedDate")
+            }
     
     async def _link_test_case_to_user_story(self, test_case_id: int, user_story_id: int) -> Dict:
         """Create a link between test case and user story"""
+        # Drop reads already in flight, and again once the write has landed (or failed)
+        # so a read that raced the request cannot re-cache the pre-link relations
+        self._stories.invalidate(user_story_id)
+        try:
+            return await self._request_story_link(test_case_id, user_story_id)
+        finally:
+            self._stories.invalidate(user_story_id)
+    
+    async def _request_story_link(self, test_case_id: int, user_story_id: int) -> Dict:
+        """Send the link request to the API"""
         link_data = [
             {
                 "op": "add",
                 "path": "/relations/-",
                 "value": {
                     "rel": "Microsoft.VSTS.Common.TestedBy-Reverse",
-                    "url": f"{self.base_url}/{self.project}/_apis/wit/workitems/{user_story_id}",
+                    "url": f"{self.wit_url}/workitems/{user_story_id}",
                     "attributes": {
                         "comment": "Tests user story"
                     }
@@ -288,25 +366,31 @@ class ADOClient:
             }
         ]
         
-        url = f"{self.base_url}/{self.project}/_apis/wit/workitems/{test_case_id}"
+        url = f"{self.wit_url}/workitems/{test_case_id}"
         params = {"api-version": "7.1-preview.3"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.patch(
-                url,
-                headers={**self.headers, "Content-Type": "application/json-patch+json"},
-                json=link_data,
-                params=params
-            ) as response:
-                
-                return {
-                    "success": response.status in [200, 201],
-                    "status_code": response.status,
-                    "error": await response.text() if response.status not in [200, 201] else None
-                }
+        session = await self._get_session()
+        async with session.patch(
+            url,
+            headers=self.patch_headers,
+            json=link_data,
+            params=params
+        ) as response:
+            
+            return {
+                "success": response.status in [200, 201],
+                "status_code": response.status,
+                "error": await response.text() if response.status not in [200, 201] else None
+            }
     
     async def update_testcase(self, testcase_id: int, updates: Dict) -> Dict:
         """Update an existing test case"""
+        # Bound concurrent writes; ALM hosts throttle writes well below reads
+        async with self._write_semaphore:
+            return await self._update_testcase(testcase_id, updates)
+    
+    async def _update_testcase(self, testcase_id: int, updates: Dict) -> Dict:
+        """Apply test case updates; called with a write slot held"""
         if not self.is_configured:
             raise ValueError("ADO client not configured")
         
@@ -350,48 +434,49 @@ class ADOClient:
             })
         
         # Apply updates
-        url = f"{self.base_url}/{self.project}/_apis/wit/workitems/{testcase_id}"
+        url = f"{self.wit_url}/workitems/{testcase_id}"
         params = {"api-version": "7.1-preview.3"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.patch(
-                url,
-                headers={**self.headers, "Content-Type": "application/json-patch+json"},
-                json=update_operations,
-                params=params
-            ) as response:
-                
-                if response.status not in [200, 201]:
-                    error_text = await response.text()
-                    return {
-                        "success": False,
-                        "error": f"Failed to update test case: {error_text}",
-                        "status_code": response.status
-                    }
-                
-                updated_item = await response.json()
-                fields = updated_item.get("fields", {})
-                
+        session = await self._get_session()
+        async with session.patch(
+            url,
+            headers=self.patch_headers,
+            json=update_operations,
+            params=params
+        ) as response:
+            
+            if response.status not in [200, 201]:
+                error_text = await response.text()
                 return {
-                    "success": True,
-                    "test_case_id": testcase_id,
-                    "title": fields.get("System.Title"),
-                    "state": fields.get("System.State"),
-                    "changed_date": fields.get("System.ChangedDate"),
-                    "updated_fields": list(updates.keys())
+                    "success": False,
+                    "error": f"Failed to update test case: {error_text}",
+                    "status_code": response.status
                 }
+            
+            updated_item = await response.json(loads=json_loads)
+            fields = updated_item.get("fields", {})
+            
+            return {
+                "success": True,
+                "test_case_id": testcase_id,
+                "title": fields.get("System.Title"),
+                "state": fields.get("System.State"),
+                "changed_date": fields.get("System.ChangedDate"),
+                "updated_fields": list(updates.keys())
+            }
     
     def _format_test_steps(self, steps: List[Dict]) -> str:
         """Format test steps into ADO XML format"""
         if not steps:
             return ""
         
-        steps_xml = "<steps>"
+        # Collect parts and join once instead of re-copying the string per step
+        parts = ["<steps>"]
         for i, step in enumerate(steps, 1):
             action = step.get("action", "")
             expected = step.get("expected", "")
             
-            steps_xml += f"""
+            parts.append(f"""
             <step id="{i}">
                 <parameterizedString isformatted="true">
                     <DIV><P>{action}</P></DIV>
@@ -400,10 +485,10 @@ class ADOClient:
                     <DIV><P>{expected}</P></DIV>
                 </parameterizedString>
                 <description/>
-            </step>"""
+            </step>""")
         
-        steps_xml += "</steps>"
-        return steps_xml
+        parts.append("</steps>")
+        return "".join(parts)
     
     async def search_work_items(self, query: str, work_item_types: List[str] = None) -> Dict:
         """Search for work items using WIQL"""
@@ -414,47 +499,47 @@ class ADOClient:
         wiql_query = f"""
         SELECT [System.Id], [System.Title], [System.State], [System.WorkItemType]
         FROM WorkItems 
-        WHERE [System.TeamProject] = '{self.project}'
-        AND [System.Title] CONTAINS '{query}'
+        WHERE [System.TeamProject] = '{_wiql_escape(self.project)}'
+        AND [System.Title] CONTAINS '{_wiql_escape(query)}'
         """
         
         if work_item_types:
-            types_str = "', '".join(work_item_types)
+            types_str = "', '".join(_wiql_escape(t) for t in work_item_types)
             wiql_query += f" AND [System.WorkItemType] IN ('{types_str}')"
         
         wiql_query += " ORDER BY [System.ChangedDate] DESC"
         
         # Execute query
-        url = f"{self.base_url}/{self.project}/_apis/wit/wiql"
+        url = f"{self.wit_url}/wiql"
         params = {"api-version": "7.1-preview.2"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                headers=self.headers,
-                json={"query": wiql_query},
-                params=params
-            ) as response:
-                
-                if response.status != 200:
-                    error_text = await response.text()
-                    return {
-                        "success": False,
-                        "error": f"Search failed: {error_text}",
-                        "status_code": response.status
-                    }
-                
-                result = await response.json()
-                work_items = result.get("workItems", [])
-                
+        session = await self._get_session()
+        async with session.post(
+            url,
+            headers=self.headers,
+            json={"query": wiql_query},
+            params=params
+        ) as response:
+            
+            if response.status != 200:
+                error_text = await response.text()
                 return {
-                    "success": True,
-                    "query": query,
-                    "total_results": len(work_items),
-                    "work_items": [
-                        {
-                            "id": item.get("id"),
-                            "url": item.get("url")
-                        } for item in work_items
-                    ]
-                }
\ No newline at end of file
+                    "success": False,
+                    "error": f"Search failed: {error_text}",
+                    "status_code": response.status
+                }
+            
+            result = await response.json(loads=json_loads)
+            work_items = result.get("workItems", [])
+            
+            return {
+                "success": True,
+                "query": query,
+                "total_results": len(work_items),
+                "work_items": [
+                    {
+                        "id": item.get("id"),
+                        "url": item.get("url")
+                    } for item in work_items
+                ]
+            }
\ No newline at end of file
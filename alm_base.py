@@ -0,0 +1,148 @@
+"""
+ALM Client Base Module
+HTTP session handling and settings shared by the ADO and Jira clients
+"""
+
+import asyncio
+import os
+import time
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:  # optional speedup, fall back to stdlib json
+    json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Connection pool shared by all requests of a client instance. When several
+# server processes talk to the same ALM host, lower this so the total stays
+# within the host's rate limits.
+MAX_CONNECTIONS = int(os.getenv("ALM_HTTP_MAX_CONNECTIONS", "20"))
+# Idle keep-alive connections are dropped after this many seconds, before
+# load balancers in front of the ALM host silently reset them.
+KEEPALIVE_TIMEOUT = float(os.getenv("ALM_HTTP_KEEPALIVE_TIMEOUT", "30"))
+DNS_CACHE_TTL = int(os.getenv("ALM_HTTP_DNS_CACHE_TTL", "300"))
+# Upper bound in seconds for a single ALM API call, so a wedged host cannot
+# hang a tool call indefinitely
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=float(os.getenv("ALM_TIMEOUT", "30")))
+# Seconds a fetched user story is served from memory; 0 disables caching,
+# including the stale copies served after transient errors
+STORY_CACHE_TTL = float(os.getenv("ALM_CACHE_TTL", "60"))
+# Most user stories kept in the cache; the oldest entries are evicted first.
+# 0 also disables caching
+STORY_CACHE_MAX_ENTRIES = int(os.getenv("ALM_CACHE_MAX_ENTRIES", "256"))
+# Test case create/update calls allowed in flight at once per client
+WRITE_CONCURRENCY = int(os.getenv("ALM_WRITE_CONCURRENCY", "4"))
+
+def is_transient_status(status: Optional[int]) -> bool:
+    """Whether an HTTP status indicates a temporary failure worth retrying"""
+    return status is not None and (status == 429 or status >= 500)
+
+class StoryCache:
+    """Fetched user stories with a TTL, single-flight requests and a stale fallback"""
+    
+    def __init__(self, fetch: Callable[[Any], Awaitable[Dict]]):
+        # fetch(story_id) requests a story and returns a result dict with "success"
+        self._fetch = fetch
+        self._entries: Dict[Any, tuple] = {}
+        self._inflight: Dict[Any, asyncio.Future] = {}
+    
+    async def get(self, story_id: Any) -> Dict:
+        """Return a story, from memory while fresh, otherwise from a shared request"""
+        cached = self._entries.get(story_id)
+        if cached is not None and time.monotonic() - cached[0] < STORY_CACHE_TTL:
+            # Shallow copy per caller: tools add keys to the result, which must not leak into the cache
+            return dict(cached[1])
+        
+        # Concurrent callers for the same story share a single request
+        task = self._inflight.get(story_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(story_id))
+            self._inflight[story_id] = task
+            task.add_done_callback(lambda done: self._finish(story_id, done))
+        
+        try:
+            result = await asyncio.shield(task)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if cached is None:
+                raise
+            logger.warning(f"Serving stale user story {story_id} after request error: {e!r}")
+            return {**cached[1], "stale": True}
+        
+        # On throttling or server errors, an expired copy beats no data at all
+        if cached is not None and not result.get("success") and is_transient_status(result.get("status_code")):
+            logger.warning(f"Serving stale user story {story_id} after HTTP {result.get('status_code')}")
+            return {**cached[1], "stale": True}
+        # The result is shared with the cache and with every coalesced caller
+        return dict(result)
+    
+    def _finish(self, story_id: Any, task: asyncio.Future):
+        """Retire an in-flight request and cache a successful result"""
+        # A request that was invalidated while in flight must not be cached
+        if self._inflight.get(story_id) is not task:
+            return
+        del self._inflight[story_id]
+        # With caching disabled nothing is kept, so there is no stale copy to fall back on either
+        if STORY_CACHE_TTL <= 0 or STORY_CACHE_MAX_ENTRIES <= 0:
+            return
+        if not task.cancelled() and task.exception() is None and task.result().get("success"):
+            # Re-insert so dict order tracks insertion time, then evict the oldest
+            self._entries.pop(story_id, None)
+            while self._entries and len(self._entries) >= STORY_CACHE_MAX_ENTRIES:
+                del self._entries[next(iter(self._entries))]
+            self._entries[story_id] = (time.monotonic(), task.result())
+    
+    def invalidate(self, story_id: Any):
+        """Forget cached and in-flight data for a story after it changes"""
+        self._entries.pop(story_id, None)
+        self._inflight.pop(story_id, None)
+    
+    def clear(self):
+        """Forget every cached and in-flight story"""
+        self._entries.clear()
+        self._inflight.clear()
+
+class ALMClientBase:
+    """Pooled HTTP session and write throttling common to the ALM clients"""
+    
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._write_semaphore = asyncio.Semaphore(WRITE_CONCURRENCY)
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        # A session is only usable on the loop it was created on
+        if self._session is not None and not self._session.closed and self._session_loop is not loop:
+            logger.warning("Replacing HTTP session bound to a different event loop")
+            stale_session, self._session = self._session, None
+            try:
+                # Release its pooled connections instead of leaking the connector
+                await stale_session.close()
+            except RuntimeError as e:
+                # Its loop is already gone, which takes the sockets with it
+                logger.debug(f"Could not close stale HTTP session: {e!r}")
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=MAX_CONNECTIONS,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT)
+            self._session_loop = loop
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
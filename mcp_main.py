@@ -3,8 +3,9 @@ Azure DevOps MCP Server - Main Entry Point
 Focused on test case generation and traceability with user stories
 """
 
-import asyncio
+import os
 import logging
+from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP
 from jira_client import JiraClient
 from ado_client import ADOClient
@@ -12,12 +13,27 @@ from vector_service import VectorService
 from traceability_manager import TraceabilityManager
 from mcp_tools import register_all_tools
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (set MCP_LOG_LEVEL=WARNING to keep per-request logging off the hot path)
+LOG_LEVEL = os.getenv("MCP_LOG_LEVEL", "INFO").upper()
+# getLevelName maps known names to their number and anything else to a "Level ..." string
+_log_level = logging.getLevelName(LOG_LEVEL)
+logging.basicConfig(level=_log_level if isinstance(_log_level, int) else logging.INFO)
 logger = logging.getLogger(__name__)
+if not isinstance(_log_level, int):
+    logger.warning(f"Unknown MCP_LOG_LEVEL {LOG_LEVEL!r}, using INFO")
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Release the ALM clients' pooled HTTP connections when the server stops"""
+    try:
+        yield {}
+    finally:
+        for client in (ado_client, jira_client):
+            if client is not None:
+                await client.close()
 
 # Initialize MCP Server
-mcp = FastMCP("ado-testcase-server")
+mcp = FastMCP("ado-testcase-server", lifespan=lifespan)
 
 # Global instances
 ado_client = None
@@ -25,7 +41,7 @@ jira_client = None
 vector_service = None
 traceability_manager = None
 
-async def initialize_services():
+def initialize_services():
     """Initialize all required services"""
     global ado_client, jira_client, vector_service, traceability_manager
     
@@ -43,6 +59,15 @@ async def initialize_services():
     logger.info("MCP Server initialized successfully with ADO + Jira support")
 
 if __name__ == "__main__":
-    asyncio.run(initialize_services())
+    # Use uvloop for the server's event loop when it is installed
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
+    # Construction and tool registration do no I/O, so no event loop is needed yet
+    initialize_services()
     logger.info("Starting MCP Server for test case generation...")
-    asyncio.run(mcp.run())
\ No newline at end of file
+    # FastMCP.run() is synchronous and starts its own event loop
+    mcp.run()
\ No newline at end of file
@@ -2,21 +2,89 @@
 MCP Tools Registration Module
 Registers all MCP tools for Azure DevOps test case generation
 """
+import asyncio
 import os
 import json
 import logging
-import aiohttp
 from typing import List, Dict, Any
+from datetime import datetime, timezone
 from mcp.types import TextContent
 
+try:
+    import orjson
+except ImportError:  # optional speedup, fall back to stdlib json
+    orjson = None
+
 logger = logging.getLogger(__name__)
 organization = os.getenv("ADO_ORG")
 project = os.getenv("ADO_PROJECT")
 personal_access_token = os.getenv("ADO_PAT")
 
+# Standard test types always suggested by the prepare_* workflow tools
+_ADO_STANDARD_SUGGESTIONS = (
+    "Generate positive path tests",
+    "Generate negative path tests",
+    "Generate boundary/edge case tests",
+    "Consider integration test scenarios",
+)
+_JIRA_STANDARD_SUGGESTIONS = (
+    "Generate positive path tests",
+    "Generate negative path tests",
+    "Generate edge case tests",
+)
+
+# Constant system_status component entries (serialized only, never mutated)
+_VECTOR_SERVICE_UNCONFIGURED = {"configured": False, "service_type": None}
+_TRACEABILITY_UNINITIALIZED = {"initialized": False}
+
+# Tool results are read by the model, so whitespace is wasted context;
+# set MCP_PRETTY_JSON=1 to indent them for debugging
+PRETTY_JSON = os.getenv("MCP_PRETTY_JSON", "").lower() in ("1", "true", "yes")
+
+# Some results (e.g. the traceability map) use int dict keys
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if PRETTY_JSON else 0)) if orjson else 0
+
+def _dumps(payload: Dict[str, Any]) -> str:
+    """Serialize a tool result to JSON"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=_ORJSON_OPTIONS).decode()
+    if PRETTY_JSON:
+        return json.dumps(payload, indent=2, ensure_ascii=False)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+def _text_response(payload: Dict[str, Any]) -> List[TextContent]:
+    """Wrap a tool result as text content (trusted payload, skips validation)"""
+    return [TextContent.model_construct(type="text", text=_dumps(payload))]
+
+def _request_key(tool_name: str, *args: Any) -> str:
+    """Build a stable key identifying a tool call by its arguments"""
+    if orjson is not None:
+        return orjson.dumps([tool_name, *args], default=str,
+                            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps([tool_name, *args], sort_keys=True, default=str, ensure_ascii=False)
+
+def _error_response(message: str, error: Exception, **context: Any) -> List[TextContent]:
+    """Build the standard failure payload for a tool"""
+    # Timeouts carry no message of their own
+    error_text = str(error) or type(error).__name__
+    return _text_response({"success": False, "error": error_text, **context, "message": message})
+
 def register_all_tools(mcp, ado_client, jira_client, vector_service, traceability_manager):
     """Register all MCP tools with the server"""
     
+    # Write operations in progress, keyed by _request_key
+    inflight_requests: Dict[str, asyncio.Future] = {}
+    
+    async def _run_deduplicated(key: str, operation) -> Dict[str, Any]:
+        """Run operation once per key while it is in flight; identical calls share the result"""
+        task = inflight_requests.get(key)
+        if task is None:
+            task = asyncio.ensure_future(operation())
+            inflight_requests[key] = task
+            task.add_done_callback(lambda _: inflight_requests.pop(key, None))
+        # Shielded so a cancelled client request does not abort a half-created batch
+        return await asyncio.shield(task)
+    
     # Configuration Tools
     @mcp.tool()
     async def configure_ado_connection(
@@ -30,15 +98,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
             # ado_client.configure()
             test_result = await ado_client.test_connection()
             
-            return [TextContent(type="text", text=json.dumps(test_result, indent=2))]
+            return _text_response(test_result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "message": "Failed to configure ADO connection"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to configure ADO connection", e)
     
     @mcp.tool()
     async def configure_vertex_ai(
@@ -52,15 +115,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
             await vector_service.configure_vertex_ai(project_id, location, index_id, endpoint_id)
             test_result = await vector_service.test_connection()
             
-            return [TextContent(type="text", text=json.dumps(test_result, indent=2))]
+            return _text_response(test_result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "message": "Failed to configure Vertex AI"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to configure Vertex AI", e)
     
     @mcp.tool()
     async def configure_alloydb(
@@ -77,15 +135,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
             await vector_service.configure_alloydb(project_id, region, cluster, instance, database, user, password)
             test_result = await vector_service.test_connection()
             
-            return [TextContent(type="text", text=json.dumps(test_result, indent=2))]
+            return _text_response(test_result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "message": "Failed to configure AlloyDB"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to configure AlloyDB", e)
     
     @mcp.tool()
     async def initialize_traceability_manager(
@@ -94,15 +147,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         """Initialize traceability manager"""
         try:
             result = await traceability_manager.initialize(persistence_file)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "message": "Failed to initialize traceability manager"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to initialize traceability manager", e)
     
     # Core ADO Tools
     @mcp.tool()
@@ -118,16 +166,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 store_result = await vector_service.store_user_story_context(user_story_id, result)
                 result["vector_storage"] = store_result
             
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "message": "Failed to fetch user story"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to fetch user story", e, user_story_id=user_story_id)
     
     @mcp.tool()
     async def fetch_testcases(
@@ -136,16 +178,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         """Get all test cases linked to a user story"""
         try:
             result = await ado_client.fetch_testcases(user_story_id)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "message": "Failed to fetch test cases"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to fetch test cases", e, user_story_id=user_story_id)
     
     @mcp.tool()
     async def create_testcase(
@@ -178,17 +214,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                     )
                     ado_result["traceability"] = trace_result
             
-            return [TextContent(type="text", text=json.dumps(ado_result, indent=2))]
+            return _text_response(ado_result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "title": title,
-                "message": "Failed to create test case"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to create test case", e, user_story_id=user_story_id, title=title)
     
     @mcp.tool()
     async def update_testcase(
@@ -214,16 +243,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 updates["state"] = state
             
             result = await ado_client.update_testcase(testcase_id, updates)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "testcase_id": testcase_id,
-                "message": "Failed to update test case"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to update test case", e, testcase_id=testcase_id)
     
     # Vector Search Tools
     @mcp.tool()
@@ -235,16 +258,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         """Search for similar user stories using vector similarity"""
         try:
             result = await vector_service.search_similar_context(query, max_results, similarity_threshold)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "query": query,
-                "message": "Failed to search similar stories"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to search similar stories", e, query=query)
     
     # Traceability Tools
     @mcp.tool()
@@ -254,16 +271,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         """Get traceability matrix between stories and test cases"""
         try:
             result = await traceability_manager.get_traceability_map(user_story_id)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "message": "Failed to get traceability map"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to get traceability map", e, user_story_id=user_story_id)
     
     @mcp.tool()
     async def get_test_cases_for_story(
@@ -272,16 +283,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         """Get all test cases linked to a specific user story from traceability matrix"""
         try:
             result = await traceability_manager.get_test_cases_for_story(user_story_id)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "message": "Failed to get test cases for story"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to get test cases for story", e, user_story_id=user_story_id)
     
     @mcp.tool()
     async def get_stories_for_test_case(
@@ -290,16 +295,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         """Get all user stories linked to a specific test case"""
         try:
             result = await traceability_manager.get_user_stories_for_test_case(test_case_id)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "test_case_id": test_case_id,
-                "message": "Failed to get stories for test case"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to get stories for test case", e, test_case_id=test_case_id)
     
     # Agent Coordination Tool (main workflow)
     @mcp.tool()
@@ -319,8 +318,11 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 "context_sources": []
             }
             
-            # 1. Fetch user story from ADO
-            user_story_result = await ado_client.fetch_user_story(user_story_id)
+            # 1. Fetch user story and its existing test cases from ADO (independent reads)
+            user_story_result, existing_tests_result = await asyncio.gather(
+                ado_client.fetch_user_story(user_story_id),
+                ado_client.fetch_testcases(user_story_id)
+            )
             if user_story_result.get("success"):
                 context_data["user_story"] = user_story_result
                 context_data["context_sources"].append("azure_devops")
@@ -333,7 +335,6 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 context_data["user_story_error"] = user_story_result.get("error")
             
             # 2. Check for existing test cases
-            existing_tests_result = await ado_client.fetch_testcases(user_story_id)
             if existing_tests_result.get("success"):
                 context_data["existing_test_cases"] = existing_tests_result
                 context_data["has_existing_tests"] = existing_tests_result.get("test_case_count", 0) > 0
@@ -379,12 +380,7 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                     test_suggestions.append("Generate functional tests for main scenarios")
                 
                 # Always suggest these standard test types
-                test_suggestions.extend([
-                    "Generate positive path tests",
-                    "Generate negative path tests", 
-                    "Generate boundary/edge case tests",
-                    "Consider integration test scenarios"
-                ])
+                test_suggestions.extend(_ADO_STANDARD_SUGGESTIONS)
                 
                 context_data["test_generation_suggestions"] = test_suggestions
             
@@ -401,97 +397,94 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 }
             })
             
-            return [TextContent(type="text", text=json.dumps(context_data, indent=2))]
+            return _text_response(context_data)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "workflow_status": "context_preparation_failed",
-                "message": "Failed to prepare test case context"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to prepare test case context", e,
+                                   user_story_id=user_story_id,
+                                   workflow_status="context_preparation_failed")
     
     # Batch Operations
-    @mcp.tool()
-    async def batch_create_testcases(
-        user_story_id: int,
-        test_cases: List[Dict[str, Any]]
-    ) -> List[TextContent]:
-        """Create multiple test cases for a user story in batch"""
-        try:
-            results = {
-                "success": True,
-                "user_story_id": user_story_id,
-                "total_requested": len(test_cases),
-                "created_count": 0,
-                "failed_count": 0,
-                "results": [],
-                "errors": []
-            }
-            
-            created_test_case_ids = []
-            
-            for i, tc_data in enumerate(test_cases):
-                try:
-                    # Create individual test case
-                    create_result = await ado_client.create_testcase(user_story_id, tc_data)
+    async def _create_ado_batch(user_story_id: int, test_cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create ADO test cases concurrently and record them in traceability"""
+        results = {
+            "success": True,
+            "user_story_id": user_story_id,
+            "total_requested": len(test_cases),
+            "created_count": 0,
+            "failed_count": 0,
+            "results": [],
+            "errors": []
+        }
+        
+        created_registrations = []
+        
+        # Create concurrently; the client's write semaphore bounds requests in flight
+        create_results = await asyncio.gather(
+            *[ado_client.create_testcase(user_story_id, tc_data) for tc_data in test_cases],
+            return_exceptions=True
+        )
+        
+        for i, (tc_data, create_result) in enumerate(zip(test_cases, create_results)):
+            title = tc_data.get("title", f"Test Case {i+1}")
+            try:
+                if isinstance(create_result, BaseException):
+                    raise create_result
+                
+                if create_result.get("success"):
+                    results["created_count"] += 1
+                    results["results"].append(create_result)
                     
-                    if create_result.get("success"):
-                        results["created_count"] += 1
-                        results["results"].append(create_result)
-                        
-                        test_case_id = create_result.get("test_case_id")
-                        if test_case_id:
-                            created_test_case_ids.append(test_case_id)
-                            
-                            # Register in traceability
-                            if traceability_manager.is_initialized:
-                                await traceability_manager.register_test_case(
-                                    test_case_id,
-                                    tc_data.get("title", f"Test Case {i+1}"),
-                                    "Active",
-                                    [user_story_id],
-                                    "batch_agent_generated"
-                                )
-                    else:
-                        results["failed_count"] += 1
-                        results["errors"].append({
-                            "index": i,
-                            "title": tc_data.get("title", f"Test Case {i+1}"),
-                            "error": create_result.get("error", "Unknown error")
+                    test_case_id = create_result.get("test_case_id")
+                    if test_case_id:
+                        created_registrations.append({
+                            "test_case_id": test_case_id,
+                            "title": title
                         })
-                
-                except Exception as tc_error:
+                else:
                     results["failed_count"] += 1
                     results["errors"].append({
                         "index": i,
-                        "title": tc_data.get("title", f"Test Case {i+1}"),
-                        "error": str(tc_error)
+                        "title": title,
+                        "error": create_result.get("error", "Unknown error")
                     })
             
-            # Update traceability with all created test cases
-            if created_test_case_ids and traceability_manager.is_initialized:
-                await traceability_manager.add_traceability_entry(
-                    user_story_id, 
-                    created_test_case_ids,
-                    {"batch_operation": True, "generation_method": "agent_batch"}
-                )
-            
-            results["success"] = results["failed_count"] == 0
-            results["message"] = f"Batch operation completed: {results['created_count']} created, {results['failed_count']} failed"
-            
-            return [TextContent(type="text", text=json.dumps(results, indent=2))]
+            except Exception as tc_error:
+                results["failed_count"] += 1
+                results["errors"].append({
+                    "index": i,
+                    "title": title,
+                    "error": str(tc_error)
+                })
+        
+        # Register and link all created test cases in traceability with a single write
+        if created_registrations and traceability_manager.is_initialized:
+            await traceability_manager.register_test_cases(
+                created_registrations, [user_story_id], "batch_agent_generated",
+                link_metadata={"batch_operation": True, "generation_method": "agent_batch"}
+            )
+        
+        results["success"] = results["failed_count"] == 0
+        results["message"] = f"Batch operation completed: {results['created_count']} created, {results['failed_count']} failed"
+        
+        return results
+    
+    @mcp.tool()
+    async def batch_create_testcases(
+        user_story_id: int,
+        test_cases: List[Dict[str, Any]]
+    ) -> List[TextContent]:
+        """Create multiple test cases for a user story in batch"""
+        try:
+            # A client retrying after a timeout joins the running batch instead of duplicating it
+            results = await _run_deduplicated(
+                _request_key("batch_create_testcases", user_story_id, test_cases),
+                lambda: _create_ado_batch(user_story_id, test_cases)
+            )
+            return _text_response(results)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "user_story_id": user_story_id,
-                "message": "Failed to perform batch test case creation"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to perform batch test case creation", e, user_story_id=user_story_id)
     
     # System Status Tools
     @mcp.tool()
@@ -500,7 +493,7 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         try:
             status = {
                 "success": True,
-                "timestamp": "2024-01-01T00:00:00Z",  # Will be set by actual implementation
+                "timestamp": datetime.now(timezone.utc).isoformat(),
                 "components": {}
             }
             
@@ -516,60 +509,39 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 vector_stats = await vector_service.get_storage_stats()
                 status["components"]["vector_service"] = vector_stats
             else:
-                status["components"]["vector_service"] = {
-                    "configured": False,
-                    "service_type": None
-                }
+                status["components"]["vector_service"] = _VECTOR_SERVICE_UNCONFIGURED
             
             # Traceability Manager status
             if traceability_manager.is_initialized:
-                trace_map = await traceability_manager.get_traceability_map()
                 status["components"]["traceability_manager"] = {
                     "initialized": True,
-                    "summary": trace_map.get("summary", {}),
+                    "summary": traceability_manager.get_summary(),
                     "persistence_file": traceability_manager.persistence_file
                 }
             else:
-                status["components"]["traceability_manager"] = {
-                    "initialized": False
-                }
+                status["components"]["traceability_manager"] = _TRACEABILITY_UNINITIALIZED
             
-            # Overall health
-            all_healthy = (
-                ado_client.is_configured and
-                (vector_service.is_configured or True) and  # Vector service is optional
-                traceability_manager.is_initialized
-            )
+            # Overall health (the vector service is optional, so it does not count)
+            all_healthy = ado_client.is_configured and traceability_manager.is_initialized
             
             status["overall_health"] = "healthy" if all_healthy else "needs_configuration"
             
-            return [TextContent(type="text", text=json.dumps(status, indent=2))]
+            return _text_response(status)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "message": "Failed to get system status"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to get system status", e)
     
     @mcp.tool()
     async def generate_traceability_report(
-        format_type: str = "summary"  # summary, detailed, matrix
+        format_type: str = "summary"  # summary, detailed, matrix, matrix_columns
     ) -> List[TextContent]:
         """Generate comprehensive traceability report"""
         try:
             result = await traceability_manager.generate_traceability_report(format_type)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
             
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "format_type": format_type,
-                "message": "Failed to generate traceability report"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to generate traceability report", e, format_type=format_type)
     
     # ========================================
     # JIRA TOOLS
@@ -586,14 +558,9 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
         try:
             jira_client.configure(base_url, email, api_token, project_key)
             test_result = await jira_client.test_connection()
-            return [TextContent(type="text", text=json.dumps(test_result, indent=2))]
+            return _text_response(test_result)
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "message": "Failed to configure Jira connection"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to configure Jira connection", e)
     
     @mcp.tool()
     async def fetch_jira_issue(issue_key: str) -> List[TextContent]:
@@ -605,30 +572,18 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 store_result = await vector_service.store_user_story_context(issue_key, result)
                 result["vector_storage"] = store_result
             
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "issue_key": issue_key,
-                "message": "Failed to fetch Jira issue"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to fetch Jira issue", e, issue_key=issue_key)
     
     @mcp.tool()
     async def fetch_jira_testcases(story_key: str) -> List[TextContent]:
         """Get all test cases linked to a Jira story"""
         try:
             result = await jira_client.fetch_testcases(story_key)
-            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+            return _text_response(result)
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "story_key": story_key,
-                "message": "Failed to fetch Jira test cases"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to fetch Jira test cases", e, story_key=story_key)
     
     @mcp.tool()
     async def create_jira_testcase(
@@ -659,91 +614,88 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                     )
                     jira_result["traceability"] = trace_result
             
-            return [TextContent(type="text", text=json.dumps(jira_result, indent=2))]
+            return _text_response(jira_result)
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "story_key": story_key,
-                "title": title,
-                "message": "Failed to create Jira test case"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed to create Jira test case", e, story_key=story_key, title=title)
     
-    @mcp.tool()
-    async def batch_create_jira_testcases(
-        story_key: str,
-        test_cases: List[Dict[str, Any]]
-    ) -> List[TextContent]:
-        """Create multiple Jira test cases for a story in batch"""
-        try:
-            results = {
-                "success": True,
-                "story_key": story_key,
-                "total_requested": len(test_cases),
-                "created_count": 0,
-                "failed_count": 0,
-                "results": [],
-                "errors": []
-            }
-            
-            created_test_case_keys = []
-            
-            for i, tc_data in enumerate(test_cases):
-                try:
-                    create_result = await jira_client.create_testcase(story_key, tc_data)
+    async def _create_jira_batch(story_key: str, test_cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create Jira test cases concurrently and record them in traceability"""
+        results = {
+            "success": True,
+            "story_key": story_key,
+            "total_requested": len(test_cases),
+            "created_count": 0,
+            "failed_count": 0,
+            "results": [],
+            "errors": []
+        }
+        
+        created_registrations = []
+        
+        # Create concurrently; the client's write semaphore bounds requests in flight
+        create_results = await asyncio.gather(
+            *[jira_client.create_testcase(story_key, tc_data) for tc_data in test_cases],
+            return_exceptions=True
+        )
+        
+        for i, (tc_data, create_result) in enumerate(zip(test_cases, create_results)):
+            title = tc_data.get("title", f"Test Case {i+1}")
+            try:
+                if isinstance(create_result, BaseException):
+                    raise create_result
+                
+                if create_result.get("success"):
+                    results["created_count"] += 1
+                    results["results"].append(create_result)
                     
-                    if create_result.get("success"):
-                        results["created_count"] += 1
-                        results["results"].append(create_result)
-                        
-                        test_case_key = create_result.get("test_case_key")
-                        if test_case_key:
-                            created_test_case_keys.append(test_case_key)
-                            
-                            if traceability_manager.is_initialized:
-                                await traceability_manager.register_test_case(
-                                    test_case_key,
-                                    tc_data.get("title", f"Test Case {i+1}"),
-                                    "Active",
-                                    [story_key],
-                                    "jira_batch_agent_generated"
-                                )
-                    else:
-                        results["failed_count"] += 1
-                        results["errors"].append({
-                            "index": i,
-                            "title": tc_data.get("title", f"Test Case {i+1}"),
-                            "error": create_result.get("error", "Unknown error")
+                    test_case_key = create_result.get("test_case_key")
+                    if test_case_key:
+                        created_registrations.append({
+                            "test_case_id": test_case_key,
+                            "title": title
                         })
-                
-                except Exception as tc_error:
+                else:
                     results["failed_count"] += 1
                     results["errors"].append({
                         "index": i,
-                        "title": tc_data.get("title", f"Test Case {i+1}"),
-                        "error": str(tc_error)
+                        "title": title,
+                        "error": create_result.get("error", "Unknown error")
                     })
             
-            if created_test_case_keys and traceability_manager.is_initialized:
-                await traceability_manager.add_traceability_entry(
-                    story_key, 
-                    created_test_case_keys,
-                    {"batch_operation": True, "generation_method": "jira_agent_batch", "alm": "jira"}
-                )
-            
-            results["success"] = results["failed_count"] == 0
-            results["message"] = f"Batch: {results['created_count']} created, {results['failed_count']} failed"
-            
-            return [TextContent(type="text", text=json.dumps(results, indent=2))]
+            except Exception as tc_error:
+                results["failed_count"] += 1
+                results["errors"].append({
+                    "index": i,
+                    "title": title,
+                    "error": str(tc_error)
+                })
+        
+        if created_registrations and traceability_manager.is_initialized:
+            await traceability_manager.register_test_cases(
+                created_registrations, [story_key], "jira_batch_agent_generated",
+                link_metadata={"batch_operation": True, "generation_method": "jira_agent_batch", "alm": "jira"}
+            )
+        
+        results["success"] = results["failed_count"] == 0
+        results["message"] = f"Batch: {results['created_count']} created, {results['failed_count']} failed"
+        
+        return results
+    
+    @mcp.tool()
+    async def batch_create_jira_testcases(
+        story_key: str,
+        test_cases: List[Dict[str, Any]]
+    ) -> List[TextContent]:
+        """Create multiple Jira test cases for a story in batch"""
+        try:
+            # A client retrying after a timeout joins the running batch instead of duplicating it
+            results = await _run_deduplicated(
+                _request_key("batch_create_jira_testcases", story_key, test_cases),
+                lambda: _create_jira_batch(story_key, test_cases)
+            )
+            return _text_response(results)
         except Exception as e:
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "story_key": story_key,
-                "message": "Failed batch Jira test case creation"
-            }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _error_response("Failed batch Jira test case creation", e, story_key=story_key)
     
     @mcp.tool()
     async def prepare_jira_test_case_context(
@@ -760,7 +712,10 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 "context_sources": []
             }
             
-            story_result = await jira_client.fetch_user_story(story_key)
+            story_result, existing_tests_result = await asyncio.gather(
+                jira_client.fetch_user_story(story_key),
+                jira_client.fetch_testcases(story_key)
+            )
             if story_result.get("success"):
                 context_data["user_story"] = story_result
                 context_data["context_sources"].append("jira")
@@ -771,7 +726,6 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
             else:
                 context_data["user_story_error"] = story_result.get("error")
             
-            existing_tests_result = await jira_client.fetch_testcases(story_key)
             if existing_tests_result.get("success"):
                 context_data["existing_test_cases"] = existing_tests_result
                 context_data["has_existing_tests"] = existing_tests_result.get("test_case_count", 0) > 0
@@ -804,11 +758,7 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                     test_suggestions.append("Generate tests from acceptance criteria")
                 if story_result.get("description"):
                     test_suggestions.append("Generate functional tests")
-                test_suggestions.extend([
-                    "Generate positive path tests",
-                    "Generate negative path tests",
-                    "Generate edge case tests"
-                ])
+                test_suggestions.extend(_JIRA_STANDARD_SUGGESTIONS)
                 context_data["test_generation_suggestions"] = test_suggestions
             
             context_data.update({
@@ -818,7 +768,7 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 "ready_for_generation": story_result.get("success", False)
             })
             
-            return [TextContent(type="text", text=json.dumps(context_data, indent=2))]
+            return _text_response(context_data)
         except Exception as e:
             error_result = {
                 "success": False,
@@ -826,6 +776,6 @@ def register_all_tools(mcp, ado_client, jira_client, vector_service, traceabilit
                 "story_key": story_key,
                 "workflow_status": "context_preparation_failed"
             }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return _text_response(error_result)
         
     logger.info("All MCP tools registered (ADO + Jira)")  # ← This line should already exist
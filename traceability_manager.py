@@ -3,16 +3,42 @@ Traceability Manager Module
 Maintains traceability matrix between user stories and test cases
 """
 
+import asyncio
+import contextlib
 import json
 import logging
-from typing import Dict, List, Optional, Any, Set
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional, Any, Union
 from datetime import datetime, timezone
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # optional speedup, fall back to stdlib json
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+# _report_cache keys for the full get_traceability_map() result and get_summary()
+_FULL_MAP_CACHE_KEY = "__full_map__"
+_SUMMARY_CACHE_KEY = "__summary__"
+
+def _utc_now_iso() -> str:
+    """Current UTC time as an ISO-8601 string"""
+    return datetime.now(timezone.utc).isoformat()
+
+def _intern(value: Any) -> Any:
+    """Share one copy of a repeated enum-like string (status, generation method)"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _parse_id(key: str) -> Union[int, str]:
+    """Restore an ID from a JSON object key: ADO IDs are ints, Jira keys stay strings"""
+    return int(key) if key.isdigit() else key
+
+@dataclass(slots=True)
 class TraceabilityEntry:
     user_story_id: int
     test_case_ids: List[int]
@@ -21,7 +47,18 @@ class TraceabilityEntry:
     updated_at: str
     metadata: Dict[str, Any]
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow dict view (dataclasses.asdict deep-copies recursively)"""
+        return {
+            "user_story_id": self.user_story_id,
+            "test_case_ids": list(self.test_case_ids),
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "metadata": dict(self.metadata)
+        }
+
+@dataclass(slots=True)
 class TestCaseInfo:
     test_case_id: int
     title: str
@@ -31,76 +68,81 @@ class TestCaseInfo:
     generation_method: str  # "manual", "agent_generated", "imported"
     last_updated: str
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow dict view (dataclasses.asdict deep-copies recursively)"""
+        return {
+            "test_case_id": self.test_case_id,
+            "title": self.title,
+            "status": self.status,
+            "created_date": self.created_date,
+            "linked_user_stories": list(self.linked_user_stories),
+            "generation_method": self.generation_method,
+            "last_updated": self.last_updated
+        }
+
 class TraceabilityManager:
     def __init__(self):
         self.traceability_map: Dict[int, TraceabilityEntry] = {}
         self.test_case_registry: Dict[int, TestCaseInfo] = {}
         self.persistence_file = "traceability_matrix.json"
         self.is_initialized = False
+        # File reads and writes run in a worker thread; keep them from overlapping
+        self._save_lock = asyncio.Lock()
+        # Generated reports by format type, cleared whenever the matrix changes
+        self._report_cache: Dict[str, Dict] = {}
+        self._report_generators = {
+            "summary": self._generate_summary_report,
+            "detailed": self._generate_detailed_report,
+            "matrix": self._generate_matrix_report,
+            "matrix_columns": self._generate_matrix_columns_report
+        }
+        # In-progress initialize() as (persistence_file, task)
+        self._init_lock = asyncio.Lock()
+        self._pending_init: Optional[tuple] = None
     
     async def initialize(self, persistence_file: str = "traceability_matrix.json"):
         """Initialize traceability manager and load existing data"""
-        self.persistence_file = persistence_file
+        # Concurrent calls for the same file share a single load
+        pending = self._pending_init
+        if pending is not None and pending[0] == persistence_file and not pending[1].done():
+            return await asyncio.shield(pending[1])
         
-        try:
-            # Load existing traceability data
-            await self._load_from_file()
-            self.is_initialized = True
-            logger.info(f"Traceability manager initialized with {len(self.traceability_map)} entries")
-            
-            return {
-                "success": True,
-                "loaded_entries": len(self.traceability_map),
-                "loaded_test_cases": len(self.test_case_registry),
-                "persistence_file": self.persistence_file
-            }
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize traceability manager: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+        task = asyncio.ensure_future(self._initialize(persistence_file))
+        self._pending_init = (persistence_file, task)
+        return await asyncio.shield(task)
+    
+    async def _initialize(self, persistence_file: str) -> Dict:
+        """Load the persistence file; initializations for different files run one at a time"""
+        async with self._init_lock:
+            try:
+                # Load existing traceability data; saves keep going to the old file until this finishes
+                await self._load_from_file(persistence_file)
+                self.persistence_file = persistence_file
+                self.is_initialized = True
+                logger.info(f"Traceability manager initialized with {len(self.traceability_map)} entries")
+                
+                return {
+                    "success": True,
+                    "loaded_entries": len(self.traceability_map),
+                    "loaded_test_cases": len(self.test_case_registry),
+                    "persistence_file": self.persistence_file
+                }
+                
+            except Exception as e:
+                logger.error(f"Failed to initialize traceability manager: {e}")
+                return {
+                    "success": False,
+                    "error": str(e)
+                }
     
     async def add_traceability_entry(self, user_story_id: int, test_case_ids: List[int], 
                                    metadata: Dict[str, Any] = None) -> Dict:
         """Add or update traceability entry"""
         try:
-            current_time = datetime.now(timezone.utc).isoformat()
-            
-            # Check if entry exists
-            if user_story_id in self.traceability_map:
-                # Update existing entry
-                entry = self.traceability_map[user_story_id]
-                
-                # Merge test case IDs (avoid duplicates)
-                existing_ids = set(entry.test_case_ids)
-                new_ids = set(test_case_ids)
-                merged_ids = list(existing_ids.union(new_ids))
-                
-                entry.test_case_ids = merged_ids
-                entry.updated_at = current_time
-                
-                if metadata:
-                    entry.metadata.update(metadata)
-                
-                action = "updated"
-            else:
-                # Create new entry
-                entry = TraceabilityEntry(
-                    user_story_id=user_story_id,
-                    test_case_ids=test_case_ids,
-                    status="active",
-                    created_at=current_time,
-                    updated_at=current_time,
-                    metadata=metadata or {}
-                )
-                self.traceability_map[user_story_id] = entry
-                action = "created"
-            
-            # Update test case registry
-            for tc_id in test_case_ids:
-                await self._update_test_case_registry(tc_id, user_story_id)
+            current_time = _utc_now_iso()
+            entry, action = self._apply_traceability_entry(
+                user_story_id, test_case_ids, metadata, current_time
+            )
             
             # Persist changes
             await self._save_to_file()
@@ -122,6 +164,48 @@ class TraceabilityManager:
                 "user_story_id": user_story_id
             }
     
+    def _apply_traceability_entry(self, user_story_id: int, test_case_ids: List[int],
+                                  metadata: Optional[Dict[str, Any]], current_time: str):
+        """Add or update a traceability entry in memory without persisting it"""
+        self._invalidate_reports()
+        
+        # Check if entry exists
+        if user_story_id in self.traceability_map:
+            # Update existing entry
+            entry = self.traceability_map[user_story_id]
+            
+            # Merge test case IDs (avoid duplicates, keep link order)
+            seen = set(entry.test_case_ids)
+            for tc_id in test_case_ids:
+                if tc_id not in seen:
+                    seen.add(tc_id)
+                    entry.test_case_ids.append(tc_id)
+            
+            entry.updated_at = current_time
+            
+            if metadata:
+                entry.metadata.update(metadata)
+            
+            action = "updated"
+        else:
+            # Create new entry
+            entry = TraceabilityEntry(
+                user_story_id=user_story_id,
+                test_case_ids=list(dict.fromkeys(test_case_ids)),
+                status="active",
+                created_at=current_time,
+                updated_at=current_time,
+                metadata=metadata or {}
+            )
+            self.traceability_map[user_story_id] = entry
+            action = "created"
+        
+        # Update test case registry
+        for tc_id in test_case_ids:
+            self._update_test_case_registry(tc_id, user_story_id, current_time)
+        
+        return entry, action
+    
     async def get_traceability_map(self, user_story_id: int = None) -> Dict:
         """Get traceability map for specific user story or all entries"""
         try:
@@ -132,7 +216,7 @@ class TraceabilityManager:
                     return {
                         "success": True,
                         "user_story_id": user_story_id,
-                        "traceability_entry": asdict(entry),
+                        "traceability_entry": entry.to_dict(),
                         "test_case_count": len(entry.test_case_ids)
                     }
                 else:
@@ -143,17 +227,23 @@ class TraceabilityManager:
                         "message": "No traceability entry found"
                     }
             else:
-                # Get all entries
+                # Get all entries (cached until the next change, like reports)
+                cached = self._report_cache.get(_FULL_MAP_CACHE_KEY)
+                if cached is not None:
+                    return dict(cached)
+                
                 all_entries = {}
                 for story_id, entry in self.traceability_map.items():
-                    all_entries[story_id] = asdict(entry)
+                    all_entries[story_id] = entry.to_dict()
                 
-                return {
+                result = {
                     "success": True,
                     "total_entries": len(all_entries),
                     "traceability_map": all_entries,
-                    "summary": self._generate_summary()
+                    "summary": self.get_summary()
                 }
+                self._report_cache[_FULL_MAP_CACHE_KEY] = result
+                return dict(result)
                 
         except Exception as e:
             logger.error(f"Failed to get traceability map: {e}")
@@ -166,27 +256,10 @@ class TraceabilityManager:
                                linked_user_stories: List[int], generation_method: str = "unknown") -> Dict:
         """Register a test case in the registry"""
         try:
-            current_time = datetime.now(timezone.utc).isoformat()
-            
-            test_case_info = TestCaseInfo(
-                test_case_id=test_case_id,
-                title=title,
-                status=status,
-                created_date=current_time,
-                linked_user_stories=linked_user_stories,
-                generation_method=generation_method,
-                last_updated=current_time
+            self._apply_test_case_registration(
+                test_case_id, title, status, linked_user_stories, generation_method, _utc_now_iso()
             )
             
-            self.test_case_registry[test_case_id] = test_case_info
-            
-            # Update traceability entries
-            for story_id in linked_user_stories:
-                await self.add_traceability_entry(story_id, [test_case_id], {
-                    "test_case_title": title,
-                    "generation_method": generation_method
-                })
-            
             # Persist changes
             await self._save_to_file()
             
@@ -206,6 +279,71 @@ class TraceabilityManager:
                 "test_case_id": test_case_id
             }
     
+    async def register_test_cases(self, test_cases: List[Dict[str, Any]], linked_user_stories: List[int],
+                                generation_method: str = "unknown",
+                                link_metadata: Optional[Dict[str, Any]] = None) -> Dict:
+        """Register several test cases and persist once
+
+        Each item needs "test_case_id" and "title"; "status" defaults to "Active".
+        link_metadata, if given, is merged into each linked story's entry as well.
+        """
+        try:
+            current_time = _utc_now_iso()
+            
+            for tc in test_cases:
+                self._apply_test_case_registration(
+                    tc["test_case_id"], tc["title"], tc.get("status", "Active"),
+                    list(linked_user_stories), generation_method, current_time
+                )
+            
+            if link_metadata:
+                test_case_ids = [tc["test_case_id"] for tc in test_cases]
+                for story_id in linked_user_stories:
+                    self._apply_traceability_entry(story_id, test_case_ids, link_metadata, current_time)
+            
+            # Persist changes
+            await self._save_to_file()
+            
+            return {
+                "success": True,
+                "test_case_ids": [tc["test_case_id"] for tc in test_cases],
+                "registered_count": len(test_cases),
+                "linked_user_stories": linked_user_stories,
+                "generation_method": generation_method
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to register test cases: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _apply_test_case_registration(self, test_case_id: int, title: str, status: str,
+                                      linked_user_stories: List[int], generation_method: str,
+                                      current_time: str):
+        """Register a test case and link it to its stories in memory without persisting"""
+        self._invalidate_reports()
+        
+        test_case_info = TestCaseInfo(
+            test_case_id=test_case_id,
+            title=title,
+            status=status,
+            created_date=current_time,
+            linked_user_stories=linked_user_stories,
+            generation_method=generation_method,
+            last_updated=current_time
+        )
+        
+        self.test_case_registry[test_case_id] = test_case_info
+        
+        # Update traceability entries
+        for story_id in linked_user_stories:
+            self._apply_traceability_entry(story_id, [test_case_id], {
+                "test_case_title": title,
+                "generation_method": generation_method
+            }, current_time)
+    
     async def remove_traceability_link(self, user_story_id: int, test_case_id: int) -> Dict:
         """Remove a specific test case from user story traceability"""
         try:
@@ -218,8 +356,10 @@ class TraceabilityManager:
             entry = self.traceability_map[user_story_id]
             
             if test_case_id in entry.test_case_ids:
+                self._invalidate_reports()
+                current_time = _utc_now_iso()
                 entry.test_case_ids.remove(test_case_id)
-                entry.updated_at = datetime.now(timezone.utc).isoformat()
+                entry.updated_at = current_time
                 
                 # If no test cases left, mark as deprecated
                 if not entry.test_case_ids:
@@ -230,7 +370,7 @@ class TraceabilityManager:
                     tc_info = self.test_case_registry[test_case_id]
                     if user_story_id in tc_info.linked_user_stories:
                         tc_info.linked_user_stories.remove(user_story_id)
-                        tc_info.last_updated = datetime.now(timezone.utc).isoformat()
+                        tc_info.last_updated = current_time
                 
                 # Persist changes
                 await self._save_to_file()
@@ -353,14 +493,18 @@ class TraceabilityManager:
     async def generate_traceability_report(self, format_type: str = "summary") -> Dict:
         """Generate comprehensive traceability report"""
         try:
-            if format_type == "summary":
-                return await self._generate_summary_report()
-            elif format_type == "detailed":
-                return await self._generate_detailed_report()
-            elif format_type == "matrix":
-                return await self._generate_matrix_report()
-            else:
+            generator = self._report_generators.get(format_type)
+            if generator is None:
                 raise ValueError(f"Unsupported format type: {format_type}")
+            
+            # Callers get shallow copies so changing a report cannot corrupt the cache
+            cached = self._report_cache.get(format_type)
+            if cached is not None:
+                return dict(cached)
+            
+            report = generator()
+            self._report_cache[format_type] = report
+            return dict(report)
                 
         except Exception as e:
             logger.error(f"Failed to generate traceability report: {e}")
@@ -369,15 +513,21 @@ class TraceabilityManager:
                 "error": str(e)
             }
     
-    async def _generate_summary_report(self) -> Dict:
+    def _generate_summary_report(self) -> Dict:
         """Generate summary traceability report"""
         total_user_stories = len(self.traceability_map)
         total_test_cases = len(self.test_case_registry)
         
-        # Count by status
+        # Count by status and gather coverage in a single pass
         status_counts = {"active": 0, "archived": 0, "deprecated": 0}
+        stories_with_tests = 0
+        total_links = 0
         for entry in self.traceability_map.values():
             status_counts[entry.status] = status_counts.get(entry.status, 0) + 1
+            link_count = len(entry.test_case_ids)
+            if link_count:
+                stories_with_tests += 1
+                total_links += link_count
         
         # Count by generation method
         generation_counts = {}
@@ -387,15 +537,15 @@ class TraceabilityManager:
         
         # Coverage analysis
         coverage_stats = {
-            "stories_with_tests": len([e for e in self.traceability_map.values() if e.test_case_ids]),
-            "stories_without_tests": len([e for e in self.traceability_map.values() if not e.test_case_ids]),
-            "avg_tests_per_story": sum(len(e.test_case_ids) for e in self.traceability_map.values()) / max(total_user_stories, 1)
+            "stories_with_tests": stories_with_tests,
+            "stories_without_tests": total_user_stories - stories_with_tests,
+            "avg_tests_per_story": total_links / max(total_user_stories, 1)
         }
         
         return {
             "success": True,
             "report_type": "summary",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "generated_at": _utc_now_iso(),
             "totals": {
                 "user_stories": total_user_stories,
                 "test_cases": total_test_cases
@@ -405,7 +555,7 @@ class TraceabilityManager:
             "coverage_statistics": coverage_stats
         }
     
-    async def _generate_detailed_report(self) -> Dict:
+    def _generate_detailed_report(self) -> Dict:
         """Generate detailed traceability report"""
         detailed_entries = []
         
@@ -441,12 +591,12 @@ class TraceabilityManager:
         return {
             "success": True,
             "report_type": "detailed",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "generated_at": _utc_now_iso(),
             "entries": detailed_entries,
             "total_entries": len(detailed_entries)
         }
     
-    async def _generate_matrix_report(self) -> Dict:
+    def _generate_matrix_report(self) -> Dict:
         """Generate matrix-style traceability report"""
         matrix_data = []
         
@@ -462,60 +612,107 @@ class TraceabilityManager:
         return {
             "success": True,
             "report_type": "matrix",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "generated_at": _utc_now_iso(),
             "matrix": matrix_data,
             "headers": ["User_Story_ID", "Test_Case_IDs", "Test_Case_Count", "Status", "Last_Updated"]
         }
     
+    def _generate_matrix_columns_report(self) -> Dict:
+        """Generate the matrix report column-wise, naming each header once instead of per row"""
+        entries = list(self.traceability_map.values())
+        
+        return {
+            "success": True,
+            "report_type": "matrix_columns",
+            "generated_at": _utc_now_iso(),
+            "row_count": len(entries),
+            "columns": {
+                "User_Story_ID": list(self.traceability_map.keys()),
+                "Test_Case_IDs": [entry.test_case_ids for entry in entries],
+                "Test_Case_Count": [len(entry.test_case_ids) for entry in entries],
+                "Status": [entry.status for entry in entries],
+                "Last_Updated": [entry.updated_at for entry in entries]
+            }
+        }
+    
+    def get_summary(self) -> Dict:
+        """Get quick summary statistics without building the full map"""
+        # Polled by system_status; only recount after the data changes
+        summary = self._report_cache.get(_SUMMARY_CACHE_KEY)
+        if summary is None:
+            summary = self._generate_summary()
+            self._report_cache[_SUMMARY_CACHE_KEY] = summary
+        return dict(summary)
+    
+    def _invalidate_reports(self):
+        """Drop cached reports after the traceability data changes"""
+        self._report_cache.clear()
+    
     def _generate_summary(self) -> Dict:
         """Generate quick summary statistics"""
+        active_entries = 0
+        deprecated_entries = 0
+        for entry in self.traceability_map.values():
+            if entry.status == "active":
+                active_entries += 1
+            elif entry.status == "deprecated":
+                deprecated_entries += 1
+        
         return {
             "total_user_stories": len(self.traceability_map),
             "total_test_cases": len(self.test_case_registry),
-            "active_entries": len([e for e in self.traceability_map.values() if e.status == "active"]),
-            "deprecated_entries": len([e for e in self.traceability_map.values() if e.status == "deprecated"])
+            "active_entries": active_entries,
+            "deprecated_entries": deprecated_entries
         }
     
-    async def _update_test_case_registry(self, test_case_id: int, user_story_id: int):
+    def _update_test_case_registry(self, test_case_id: int, user_story_id: int,
+                                   current_time: str = None):
         """Update test case registry with user story link"""
+        current_time = current_time or _utc_now_iso()
+        
         if test_case_id in self.test_case_registry:
             tc_info = self.test_case_registry[test_case_id]
             if user_story_id not in tc_info.linked_user_stories:
                 tc_info.linked_user_stories.append(user_story_id)
-                tc_info.last_updated = datetime.now(timezone.utc).isoformat()
+                tc_info.last_updated = current_time
         else:
             # Create placeholder entry if test case not registered yet
             tc_info = TestCaseInfo(
                 test_case_id=test_case_id,
                 title="Pending Registration",
                 status="unknown",
-                created_date=datetime.now(timezone.utc).isoformat(),
+                created_date=current_time,
                 linked_user_stories=[user_story_id],
                 generation_method="unknown",
-                last_updated=datetime.now(timezone.utc).isoformat()
+                last_updated=current_time
             )
             self.test_case_registry[test_case_id] = tc_info
     
-    async def _load_from_file(self):
+    async def _load_from_file(self, path: str):
         """Load traceability data from persistence file"""
-        if not Path(self.persistence_file).exists():
-            logger.info("No existing traceability file found, starting fresh")
-            return
-        
         try:
-            with open(self.persistence_file, 'r') as f:
-                data = json.load(f)
+            # Never read while a save is writing the file
+            async with self._save_lock:
+                data = await asyncio.to_thread(self._read_file, path)
+            if data is None:
+                logger.info("No existing traceability file found, starting fresh")
+                return
+            
+            self._invalidate_reports()
             
             # Load traceability map
             for story_id_str, entry_data in data.get('traceability_map', {}).items():
-                story_id = int(story_id_str)
+                story_id = _parse_id(story_id_str)
                 entry = TraceabilityEntry(**entry_data)
+                entry.status = _intern(entry.status)
                 self.traceability_map[story_id] = entry
             
             # Load test case registry
             for tc_id_str, tc_data in data.get('test_case_registry', {}).items():
-                tc_id = int(tc_id_str)
+                tc_id = _parse_id(tc_id_str)
                 tc_info = TestCaseInfo(**tc_data)
+                tc_info.status = _intern(tc_info.status)
+                tc_info.generation_method = _intern(tc_info.generation_method)
                 self.test_case_registry[tc_id] = tc_info
             
             logger.info(f"Loaded {len(self.traceability_map)} traceability entries and {len(self.test_case_registry)} test cases")
@@ -529,19 +726,54 @@ class TraceabilityManager:
         try:
             data = {
                 'traceability_map': {
-                    str(k): asdict(v) for k, v in self.traceability_map.items()
+                    str(k): v.to_dict() for k, v in self.traceability_map.items()
                 },
                 'test_case_registry': {
-                    str(k): asdict(v) for k, v in self.test_case_registry.items()
+                    str(k): v.to_dict() for k, v in self.test_case_registry.items()
                 },
-                'last_saved': datetime.now(timezone.utc).isoformat()
+                'last_saved': _utc_now_iso()
             }
             
-            with open(self.persistence_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            async with self._save_lock:
+                await asyncio.to_thread(self._write_file, self.persistence_file, data)
             
-            logger.debug(f"Traceability data saved to {self.persistence_file}")
+            logger.debug("Traceability data saved to %s", self.persistence_file)
             
         except Exception as e:
             logger.error(f"Failed to save traceability data: {e}")
-            # Don't raise exception, just log error
\ No newline at end of file
+            # Don't raise exception, just log error
+    
+    @staticmethod
+    def _read_file(path: str) -> Optional[Dict]:
+        """Read and parse the persistence file (blocking, run off the event loop)"""
+        if not Path(path).exists():
+            return None
+        if orjson is not None:
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        with open(path, 'r') as f:
+            return json.load(f)
+    
+    @staticmethod
+    def _write_file(path: str, data: Dict):
+        """Write the persistence file compactly (blocking, run off the event loop)"""
+        if orjson is not None:
+            payload = orjson.dumps(data)
+        else:
+            payload = json.dumps(data, separators=(",", ":")).encode()
+        
+        # Write a sibling temp file and rename it over the target, so the file on
+        # disk is always either the previous save or the new one, never a partial write
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                         prefix=".traceability-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            with contextlib.suppress(FileNotFoundError):
+                # mkstemp creates the file owner-only; keep the existing file's permissions
+                os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temp_path)
+            raise
@@ -4,20 +4,81 @@ Handles vector embeddings and similarity search using Vertex AI
 """
 
 import asyncio
-import json
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Any
 from datetime import datetime, timezone
 
-# Google Cloud imports
-from google.cloud import aiplatform
+# Google Cloud / sentence-transformers / numpy are imported lazily where they
+# are first needed; importing them is slow and the vector service is optional
 # from google.cloud import alloydb_connector
 # from google.cloud.alloydb.connector import Connector
-from sentence_transformers import SentenceTransformer
-import numpy as np
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Loaded models shared across reconfigurations for the life of the process
+_embedding_models: Dict[str, Any] = {}
+
+_embedding_model_lock = asyncio.Lock()
+
+def _load_embedding_model(model_name: str = EMBEDDING_MODEL_NAME):
+    """Return a SentenceTransformer model, loading it only once per process"""
+    model = _embedding_models.get(model_name)
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        _embedding_models[model_name] = model
+    return model
+
+async def _get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME):
+    """Return the shared embedding model, loading it in a worker thread on first use"""
+    model = _embedding_models.get(model_name)
+    if model is not None:
+        return model
+    # Loading takes seconds; keep it off the event loop and do it only once
+    async with _embedding_model_lock:
+        return await asyncio.to_thread(_load_embedding_model, model_name)
+
+def _story_key(user_story_id: Any):
+    """Store key for a story: numeric ADO IDs as ints (even if passed as text), Jira keys as-is"""
+    if isinstance(user_story_id, str) and user_story_id.isdigit():
+        return int(user_story_id)
+    return user_story_id
+
+def _rank_by_similarity(store: Dict[Any, Dict], query_embedding: List[float], max_results: int,
+                        threshold: float) -> List[Dict]:
+    """Score every stored embedding against the query in one vectorized pass"""
+    if not store:
+        return []
+    
+    import numpy as np
+    
+    story_ids = list(store.keys())
+    entries = list(store.values())
+    stored = np.array([data['embedding'] for data in entries])
+    query_emb = np.array(query_embedding)
+    
+    # Cosine similarity for all rows at once
+    with np.errstate(divide='ignore', invalid='ignore'):
+        similarities = (stored @ query_emb) / (np.linalg.norm(stored, axis=1) * np.linalg.norm(query_emb))
+    
+    # Keep matches above the threshold, best first
+    matches = np.flatnonzero(similarities >= threshold)
+    matches = matches[np.argsort(-similarities[matches], kind='stable')][:max_results]
+    
+    results = []
+    for idx in matches:
+        data = entries[idx]
+        results.append({
+            'user_story_id': story_ids[idx],
+            'similarity_score': float(similarities[idx]),
+            'content': data['content'],
+            'metadata': data['metadata'],
+            'stored_at': data['stored_at']
+        })
+    return results
+
 class VectorService:
     def __init__(self):
         self.project_id = None
@@ -28,6 +89,8 @@ class VectorService:
         self.alloydb_instance = None
         self.is_configured = False
         self.service_type = None  # 'vertex' or 'alloydb'
+        # In-memory stores per service type (in production, use a Vertex AI Index / AlloyDB)
+        self._stores: Dict[str, Dict[Any, Dict]] = {'vertex': {}, 'alloydb': {}}
         
     async def configure_vertex_ai(self, project_id: str, location: str, index_id: str = None, endpoint_id: str = None):
         """Configure Vertex AI Matching Engine"""
@@ -38,11 +101,12 @@ class VectorService:
         self.service_type = 'vertex'
         
         # Initialize Vertex AI
+        from google.cloud import aiplatform
         aiplatform.init(project=project_id, location=location)
         
         # Initialize embedding model (local fallback)
         try:
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = await _get_embedding_model()
             logger.info("Local embedding model initialized as fallback")
         except Exception as e:
             logger.warning(f"Failed to initialize embedding model: {e}")
@@ -70,7 +134,7 @@ class VectorService:
         
         # Initialize embedding model
         try:
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = await _get_embedding_model()
             logger.info("Local embedding model initialized for AlloyDB")
         except Exception as e:
             logger.error(f"Failed to initialize embedding model: {e}")
@@ -174,12 +238,8 @@ class VectorService:
             embedding = await self._generate_embedding(content_text)
             
             # Store based on service type
-            if self.service_type == 'vertex':
-                result = await self._store_vertex(user_story_id, content_text, embedding, user_story_data)
-            elif self.service_type == 'alloydb':
-                result = await self._store_alloydb(user_story_id, content_text, embedding, user_story_data)
-            else:
-                raise ValueError(f"Unsupported service type: {self.service_type}")
+            result = self._store_in_memory(self._active_store(), user_story_id, content_text,
+                                           embedding, user_story_data)
             
             return {
                 "success": True,
@@ -209,12 +269,8 @@ class VectorService:
             query_embedding = await self._generate_embedding(query)
             
             # Search based on service type
-            if self.service_type == 'vertex':
-                results = await self._search_vertex(query_embedding, max_results, similarity_threshold)
-            elif self.service_type == 'alloydb':
-                results = await self._search_alloydb(query_embedding, max_results, similarity_threshold)
-            else:
-                raise ValueError(f"Unsupported service type: {self.service_type}")
+            results = _rank_by_similarity(self._active_store(), query_embedding, max_results,
+                                          similarity_threshold)
             
             return {
                 "success": True,
@@ -238,42 +294,23 @@ class VectorService:
         if not self.embedding_model:
             raise ValueError("No embedding model available")
         
-        # Use SentenceTransformer for now (can be replaced with Vertex AI embedding API)
-        embedding = self.embedding_model.encode([text])[0]
+        # Use SentenceTransformer for now (can be replaced with Vertex AI embedding API).
+        # Encoding is CPU-bound, so run it in a worker thread to keep the loop responsive
+        embedding = (await asyncio.to_thread(self.embedding_model.encode, [text]))[0]
         return embedding.tolist()
     
-    async def _store_vertex(self, user_story_id: int, content: str, embedding: List[float], 
-                           metadata: Dict) -> Dict:
-        """Store in Vertex AI Matching Engine"""
-        # For now, store in memory (in production, use Vertex AI Index)
-        # This is a simplified implementation
-        
-        if not hasattr(self, '_vertex_store'):
-            self._vertex_store = {}
-        
-        self._vertex_store[str(user_story_id)] = {
-            'content': content,
-            'embedding': embedding,
-            'metadata': metadata,
-            'stored_at': datetime.now(timezone.utc).isoformat()
-        }
-        
-        return {
-            "stored": True,
-            "storage_id": str(user_story_id),
-            "method": "memory_fallback"
-        }
+    def _active_store(self) -> Dict[Any, Dict]:
+        """Return the in-memory store for the configured service type"""
+        store = self._stores.get(self.service_type)
+        if store is None:
+            raise ValueError(f"Unsupported service type: {self.service_type}")
+        return store
     
-    async def _store_alloydb(self, user_story_id: int, content: str, embedding: List[float], 
-                            metadata: Dict) -> Dict:
-        """Store in AlloyDB with vector search"""
-        # For now, store in memory (in production, use AlloyDB connector)
-        # This is a simplified implementation
-        
-        if not hasattr(self, '_alloydb_store'):
-            self._alloydb_store = {}
-        
-        self._alloydb_store[str(user_story_id)] = {
+    @staticmethod
+    def _store_in_memory(store: Dict[Any, Dict], user_story_id: int, content: str,
+                         embedding: List[float], metadata: Dict) -> Dict:
+        """Store a story embedding in an in-memory vector store"""
+        store[_story_key(user_story_id)] = {
             'content': content,
             'embedding': embedding,
             'metadata': metadata,
@@ -286,78 +323,16 @@ class VectorService:
             "method": "memory_fallback"
         }
     
-    async def _search_vertex(self, query_embedding: List[float], max_results: int, 
-                           threshold: float) -> List[Dict]:
-        """Search Vertex AI Matching Engine"""
-        if not hasattr(self, '_vertex_store'):
-            return []
-        
-        results = []
-        for story_id, data in self._vertex_store.items():
-            # Calculate cosine similarity
-            stored_embedding = np.array(data['embedding'])
-            query_emb = np.array(query_embedding)
-            
-            similarity = np.dot(stored_embedding, query_emb) / (
-                np.linalg.norm(stored_embedding) * np.linalg.norm(query_emb)
-            )
-            
-            if similarity >= threshold:
-                results.append({
-                    'user_story_id': int(story_id),
-                    'similarity_score': float(similarity),
-                    'content': data['content'],
-                    'metadata': data['metadata'],
-                    'stored_at': data['stored_at']
-                })
-        
-        # Sort by similarity score
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return results[:max_results]
-    
-    async def _search_alloydb(self, query_embedding: List[float], max_results: int, 
-                            threshold: float) -> List[Dict]:
-        """Search AlloyDB vector store"""
-        if not hasattr(self, '_alloydb_store'):
-            return []
-        
-        results = []
-        for story_id, data in self._alloydb_store.items():
-            # Calculate cosine similarity
-            stored_embedding = np.array(data['embedding'])
-            query_emb = np.array(query_embedding)
-            
-            similarity = np.dot(stored_embedding, query_emb) / (
-                np.linalg.norm(stored_embedding) * np.linalg.norm(query_emb)
-            )
-            
-            if similarity >= threshold:
-                results.append({
-                    'user_story_id': int(story_id),
-                    'similarity_score': float(similarity),
-                    'content': data['content'],
-                    'metadata': data['metadata'],
-                    'stored_at': data['stored_at']
-                })
-        
-        # Sort by similarity score
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return results[:max_results]
-    
     async def delete_user_story_context(self, user_story_id: int) -> Dict:
         """Delete user story context from vector store"""
         try:
-            story_key = str(user_story_id)
+            story_key = _story_key(user_story_id)
             deleted = False
             
-            if self.service_type == 'vertex' and hasattr(self, '_vertex_store'):
-                if story_key in self._vertex_store:
-                    del self._vertex_store[story_key]
-                    deleted = True
-            elif self.service_type == 'alloydb' and hasattr(self, '_alloydb_store'):
-                if story_key in self._alloydb_store:
-                    del self._alloydb_store[story_key]
-                    deleted = True
+            store = self._stores.get(self.service_type)
+            if store is not None and story_key in store:
+                del store[story_key]
+                deleted = True
             
             return {
                 "success": True,
@@ -383,19 +358,13 @@ class VectorService:
                 "storage_details": {}
             }
             
-            if self.service_type == 'vertex' and hasattr(self, '_vertex_store'):
-                stats["total_stored"] = len(self._vertex_store)
-                stats["storage_details"] = {
-                    "vertex_store_entries": len(self._vertex_store),
-                    "oldest_entry": min([data['stored_at'] for data in self._vertex_store.values()]) if self._vertex_store else None,
-                    "newest_entry": max([data['stored_at'] for data in self._vertex_store.values()]) if self._vertex_store else None
-                }
-            elif self.service_type == 'alloydb' and hasattr(self, '_alloydb_store'):
-                stats["total_stored"] = len(self._alloydb_store)
+            store = self._stores.get(self.service_type)
+            if store is not None:
+                stats["total_stored"] = len(store)
                 stats["storage_details"] = {
-                    "alloydb_store_entries": len(self._alloydb_store),
-                    "oldest_entry": min([data['stored_at'] for data in self._alloydb_store.values()]) if self._alloydb_store else None,
-                    "newest_entry": max([data['stored_at'] for data in self._alloydb_store.values()]) if self._alloydb_store else None
+                    f"{self.service_type}_store_entries": len(store),
+                    "oldest_entry": min((data['stored_at'] for data in store.values()), default=None),
+                    "newest_entry": max((data['stored_at'] for data in store.values()), default=None)
                 }
             
             return {